@@ -104,10 +104,48 @@ Eigen::VectorXd GDDAgreement(Neighborhood &A, Neighborhood &B)
     return Aj;
     }
 
+pybind11::array_t<float> NGDVDistances(FloatArray A, FloatArray B)
+    {
+    // Euclidean distances between all rows of A and all rows of B
+    if( A.ndim() != 2 || B.ndim() != 2 || A.shape(1) != B.shape(1) )
+        {
+        throw std::invalid_argument("ngdvDists expects two 2D arrays with the same number of columns");
+        }
+    const pybind11::ssize_t n = A.shape(0);
+    const pybind11::ssize_t m = B.shape(0);
+    const pybind11::ssize_t d = A.shape(1);
+    pybind11::array_t<float> D(std::vector<pybind11::ssize_t>{n,m});
+    auto a = A.unchecked<2>();
+    auto b = B.unchecked<2>();
+    auto out = D.mutable_unchecked<2>();
+        {
+        pybind11::gil_scoped_release release;
+        // rows of A are independent, landmarks in B are streamed for each row
+#ifdef _OPENMP
+        #pragma omp parallel for schedule(static)
+#endif
+        for( pybind11::ssize_t i = 0; i < n; i++ )
+            {
+            for( pybind11::ssize_t j = 0; j < m; j++ )
+                {
+                float s = 0.;
+                for( pybind11::ssize_t k = 0; k < d; k++ )
+                    {
+                    float t = a(i,k) - b(j,k);
+                    s += t * t;
+                    }
+                out(i,j) = std::sqrt(s);
+                }
+            }
+        }
+    return D;
+    }
+
 void export_Comparison(pybind11::module& m)
     {
     m.def("gdvs",&GDVSimilarity);
     m.def("gdda",&GDDAgreement);
+    m.def("ngdvDists",&NGDVDistances);
     }
 
 }  // end namespace crayon
@@ -10,9 +10,14 @@
 
 #include <pybind11/pybind11.h>
 #include <pybind11/eigen.h>
+#include <pybind11/numpy.h>
 
 #include <Eigen/Core>
 
+#include <cmath>
+#include <stdexcept>
+#include <vector>
+
 #include "Neighborhood.h"
 
 namespace crayon
@@ -21,6 +26,9 @@ namespace crayon
 Eigen::MatrixXd GDVSimilarity(Neighborhood &A, Neighborhood &B);
 Eigen::VectorXd GDDAgreement(Neighborhood &A, Neighborhood &B);
 
+typedef pybind11::array_t<float, pybind11::array::c_style | pybind11::array::forcecast> FloatArray;
+pybind11::array_t<float> NGDVDistances(FloatArray A, FloatArray B);
+
 void export_Comparison(pybind11::module& m);
 
 } // end namespace crayon
@@ -72,7 +72,7 @@ class Graph(Classifier):
                       7, 6, 7, 6, 5, 5, 6, 8, 7, 6,
                       6, 8, 6, 9, 5, 6, 4, 6, 6, 7,
                       8, 6, 6, 8, 7, 6, 7, 7, 8, 5,
-                      6, 6, 4],dtype=np.float)
+                      6, 6, 4],dtype=np.float64)
         w = 1. - o / 73.
         self.ngdv = self.sgdv * w[:self.sgdv.shape[0]]
         self.ngdv = self.ngdv / max(float(np.sum(self.ngdv)),1.)
@@ -88,8 +88,8 @@ class Library:
     def __init__(self):
         self.sigs   = []
         self.items = []
-        self.counts = np.array([],dtype=np.int)
-        self.sizes = np.array([],dtype=np.int)
+        self.counts = np.array([],dtype=np.intp)
+        self.sizes = np.array([],dtype=np.intp)
         self.index = {}
         self.lookup = {}
     def build(self):
@@ -152,8 +152,40 @@ class Library:
                                size=(other.sizes[idx] if sizes else 0))
 
 class GraphLibrary(Library):
-    R""" handles sets of graphs from snapshots and ensembles of snapshots
+    R""" handles sets of graphs from snapshots and ensembles of snapshots,
+         keeping the NGDVs of all items in a contiguous array (ngdv_matrix)
     """
+    def __init__(self):
+        Library.__init__(self)
+        # rows beyond len(self.items) are unused capacity
+        self.ngdv_matrix = None
+        # library index of each neighborhood passed to build()
+        self.graph_idx = None
+    def encounter(self,item,count=1,size=0,add=True):
+        R""" adds a Graph to the library and returns its index,
+             appending its NGDV to ngdv_matrix if it is new
+
+        Args:
+            item (Graph): Graph to consider
+            count (int,optional): count to add to the library (e.g., frequency from Snapshot) (default 1)
+            add (bool,optional): should the item be added to the Library? (alternative is only find) (default True)
+
+        Returns:
+            idx (int): the index of the item's signature in the library
+        """
+        n = len(self.items)
+        idx = Library.encounter(self,item,count=count,size=size,add=add)
+        if len(self.items) > n:
+            ngdv = np.asarray(item.ngdv,dtype=np.float32)
+            if self.ngdv_matrix is None:
+                self.ngdv_matrix = np.empty((16,len(ngdv)),dtype=np.float32)
+            elif n == len(self.ngdv_matrix):
+                # grow geometrically to keep insertion amortized O(1)
+                grown = np.empty((2*n,self.ngdv_matrix.shape[1]),dtype=np.float32)
+                grown[:n] = self.ngdv_matrix
+                self.ngdv_matrix = grown
+            self.ngdv_matrix[n] = ngdv
+        return idx
     def build(self,neighborhoods,k=5):
         R""" builds the GraphLibrary from neighborhoods
 
@@ -161,11 +193,12 @@ class GraphLibrary(Library):
             neighborhoods (list): list of neighborhoods to build from
             k (int,optional): maximum graphlet size (default 5)
         """
-        g_idx = np.zeros(len(neighborhoods),dtype=np.int)
+        g_idx = np.zeros(len(neighborhoods),dtype=np.intp)
         for i, nn in enumerate(neighborhoods):
             G = Graph(nn,k)
             g_idx[i] = self.encounter(G)
+        self.graph_idx = g_idx
         for i, sig in enumerate(self.sigs):
             if sig not in self.lookup:
-                self.lookup[sig] = np.array([],dtype=np.int)
+                self.lookup[sig] = np.array([],dtype=np.intp)
             self.lookup[sig] = np.hstack((self.lookup[sig],np.argwhere(g_idx==self.index[sig]).flatten()))
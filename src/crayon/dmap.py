@@ -18,17 +18,57 @@ try:
 except:
     raise RuntimeError('dmap submodule requires PyDMap python module')
 
+try:
+    import numexpr
+    foundNumexpr = True
+except:
+    foundNumexpr = False
+
 class DMap:
     R""" container for computing diffusion maps from Ensembles of Snapshots """
     def __init__(self):
         self._cpp = PyDMap.DMap()
         self.alpha = 1.0
+        self.dist_dtype = np.float32
         self.num_evec = 4
         self.epsilon = None
+        self.epsilon_samples = 10000
         self.evals = None
         self.evecs = None
         self.evecs_ny = None
         self.coords = None
+    def power(self,X):
+        R""" raise distances to DMap.alpha in place, in a single multi-threaded
+             pass with numexpr when available
+
+        Args:
+            X (array): C-contiguous distances (overwritten)
+
+        Returns:
+            X (array): the same array, holding X**alpha
+        """
+        if foundNumexpr:
+            alpha = X.dtype.type(self.alpha)
+            numexpr.evaluate('X**alpha',local_dict={'X':X,'alpha':alpha},out=X)
+        else:
+            np.power(X,self.alpha,out=X)
+        return X
+    def estimateEpsilon(self,dists):
+        R""" estimate the kernel width as the median distance, from a fixed random
+             subsample of DMap.epsilon_samples entries for large matrices
+
+        Args:
+            dists (array): (alpha-powered) distances
+
+        Returns:
+            epsilon (float): the kernel width
+        """
+        d = dists.ravel()
+        if self.epsilon_samples is not None and len(d) > self.epsilon_samples:
+            # fixed seed keeps the embedding reproducible between runs
+            rng = np.random.RandomState(0)
+            d = d[rng.randint(0,len(d),self.epsilon_samples)]
+        return float(np.median(d))
     def build(self,dists,landmarks=None,
               valid_cols=None,
               valid_rows=None):
@@ -44,21 +84,23 @@ class DMap:
             valid_rows = np.arange(dists.shape[0])
         if valid_cols is None:
             valid_cols = np.arange(dists.shape[1])
-        alpha_dists = np.power(dists,self.alpha)
+        # single precision is sufficient for distances, eigenvectors remain double
         if landmarks is None:
-            D = alpha_dists
-            D = D[valid_rows,:]
-            D = D[:,valid_cols]
+            alpha_dists = self.power(np.array(dists,dtype=self.dist_dtype,order='C'))
+            D = np.ascontiguousarray(alpha_dists[np.ix_(valid_rows,valid_cols)])
+            eps_dists = alpha_dists
         else:
-            D = alpha_dists[landmarks,:]
-            D = D[:,valid_cols]
-            L = alpha_dists[valid_rows,:]
-            L = L[:,valid_cols]
+            # only the landmark and valid rows are ever used, so skip the rest;
+            # index once into a C-contiguous buffer and take the power in place
+            D = self.power(np.asarray(dists[np.ix_(landmarks,valid_cols)],dtype=self.dist_dtype,order='C'))
+            L = self.power(np.asarray(dists[np.ix_(valid_rows,valid_cols)],dtype=self.dist_dtype,order='C'))
+            # estimate kernel width from the landmark block alone (m^2 instead of n*m)
+            eps_dists = D
         # compute landmark manifold
         self._cpp.set_dists(D)
         self._cpp.set_num_evec(self.num_evec)
         if self.epsilon is None:
-            self.epsilon = np.median(alpha_dists)
+            self.epsilon = self.estimateEpsilon(eps_dists)
         self._cpp.set_epsilon(self.epsilon)
         self._cpp.compute()
         self.evals = np.asarray(self._cpp.get_eval())
@@ -68,13 +110,14 @@ class DMap:
             self.evecs_ny = None
         else:
             self.evecs_ny = np.asarray(PyDMap.nystrom(self._cpp,L))
-        # backfill for invalid graphs
-        evecs = np.zeros((dists.shape[1],self.num_evec))*np.nan
-        evecs[valid_cols,:] = np.array(self.evecs)
+        # backfill for invalid graphs (assign directly, the arrays above are already ndarrays)
+        evecs = np.full((dists.shape[1],self.num_evec),np.nan)
+        evecs[valid_cols,:] = self.evecs
         self.evecs = evecs
-        evecs_ny = np.zeros((dists.shape[0],self.num_evec))*np.nan
-        evecs_ny[valid_rows,:] = np.array(self.evecs_ny)
-        self.evecs_ny = evecs_ny
+        if self.evecs_ny is not None:
+            evecs_ny = np.full((dists.shape[0],self.num_evec),np.nan)
+            evecs_ny[valid_rows,:] = self.evecs_ny
+            self.evecs_ny = evecs_ny
         # construct uniformly coordinates for mapping to RGB space
         if self.evecs_ny is None:
             R = self.evecs
@@ -38,17 +38,18 @@ def readXYZ(filename):
     """
     # read values from file
     with open(filename,'r') as config:
-        lines = config.readlines()
-    N = int(lines[0])
-    if 'Lattice=' in lines[1]:
-        box = np.asarray([float(x) for x in lines[1].replace('Lattice=','').replace('"','').split()[::4]])
-    elif len(lines[1].split) == 3:
-        box = np.asarray([float(x) for x in lines[1].split()])
-    else:
-        raise RuntimeError('unexpected box format in file %s'%filename)
-    xyz = np.zeros((N,3))
-    for i, l in enumerate(lines[2:]):
-        xyz[i,:] = [float(x) for x in l.split()[1:]]
+        N = int(config.readline())
+        header = config.readline()
+        if 'Lattice=' in header:
+            box = np.asarray([float(x) for x in header.replace('Lattice=','').replace('"','').split()[::4]])
+        elif len(header.split()) == 3:
+            box = np.asarray([float(x) for x in header.split()])
+        else:
+            raise RuntimeError('unexpected box format in file %s'%filename)
+        # parse particle positions in C rather than line by line
+        xyz = np.loadtxt(config,usecols=(1,2,3),dtype=np.float64,ndmin=2)
+    if len(xyz) != N:
+        raise RuntimeError('expected %d particles but found %d in file %s'%(N,len(xyz),filename))
     return xyz, box
 
 def readXML(filename):
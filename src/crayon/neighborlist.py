@@ -105,7 +105,7 @@ def shell(i,NL,n):
         shell2 = []
         for j in range(len(idx)):
             shell2 += list(NL[idx[j]])
-        shell2 = np.unique(np.array(shell2,dtype=np.int))
+        shell2 = np.unique(np.array(shell2,dtype=np.intp))
         idx = np.array(shell2)
         s += 1
     return idx
@@ -157,7 +157,7 @@ class Network:
                       7, 6, 7, 6, 5, 5, 6, 8, 7, 6,
                       6, 8, 6, 9, 5, 6, 4, 6, 6, 7,
                       8, 6, 6, 8, 7, 6, 7, 7, 8, 5,
-                      6, 6, 4],dtype=np.float)
+                      6, 6, 4],dtype=np.float64)
         w = 1. - o / 73.
         self.ngdv = self.gdv * w[:self.gdv.shape[1]]
         ones = np.ones(snap.N)
@@ -318,7 +318,7 @@ class Voronoi(NeighborList):
         Returns:
         """
         # get neighbors from triangulation
-        nn = np.array(neighbors[nl_idx],dtype=np.int)
+        nn = np.array(neighbors[nl_idx],dtype=np.intp)
         n_voro = len(nn)
         # remove negative IDs (Voro++ indicating that a particle is its own neighbor)
         #    this line is problematic for type-specific operations
@@ -380,7 +380,7 @@ class Voronoi(NeighborList):
                 nn = self.filterNeighbors(idx,idx,nl,snap)
             else:
                 nn = nl[idx]
-            all_neighbors.append(np.array(nn,dtype=np.int))
+            all_neighbors.append(np.array(nn,dtype=np.intp))
         if self.enforce_symmetry:
             self.symmetrize(all_neighbors)
         if self.max_neighbors is not None:
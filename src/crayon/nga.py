@@ -17,10 +17,40 @@ from crayon import io
 from crayon import util
 
 import numpy as np
-from scipy.cluster import hierarchy
+import itertools
+import multiprocessing
 import pickle
 
-class Snapshot:
+def writeColorMap(filename,fdat,binary=False):
+    R""" write a color map to file, either as text (`filename.cmap`) or
+         as a float32 NumPy binary (`filename.cmap.npy`)
+
+    Args:
+        filename (str): filename of the corresponding snapshot
+        fdat (array): `Nx4` array of signature index and RGB values
+        binary (bool,optional): write NumPy binary instead of text? (default False)
+    """
+    if binary:
+        np.save(filename + '.cmap.npy', fdat.astype(np.float32))
+    else:
+        # 6 significant digits is plenty for RGB values
+        np.savetxt(filename + '.cmap', fdat, fmt=['%d','%.6g','%.6g','%.6g'])
+
+def _writeFrame(task):
+    R""" rotate colors and write the color map for a single frame
+         (module-level so it can be dispatched to a multiprocessing.Pool)
+
+    Args:
+        task (tuple): filename, `Nx1` signature indices, `Nx3` color coordinates,
+                      `3x3` color rotation matrix (or None), and binary flag
+    """
+    filename, fm, cc, R, binary = task
+    if R is not None:
+        cc = util.applyRotation(cc,R)
+    fdat = np.hstack((fm,cc))
+    writeColorMap(filename,fdat,binary=binary)
+
+class Snapshot(object):
     R""" holds necessary data from a simulation snapshot and handles
          neighborlist generation and graph library construction
 
@@ -32,6 +62,8 @@ class Snapshot:
     """
     def __init__(self,xyz=None,box=None,nl=None,pbc='xyz'):
         # initialize class member variables
+        self._box = None
+        self._pbc = None
         self.neighbors = None
         self.adjacency = None
         self.library = None
@@ -66,9 +98,34 @@ class Snapshot:
                 if s < 1e-4:
                     print('detected 2D configuration')
                     # force values for better compatibility with Voro++
-                    self.box[i] = 1.
+                    box = np.array(self.box)
+                    box[i] = 1.
+                    self.box = box
                     self.xyz[:,i] = 0.
                     self.pbc = self.pbc.replace(dims[i],'')
+    @property
+    def box(self):
+        R""" box dimensions (`Lx,Ly,Lz`), stored read-only so that in-place edits fail
+             loudly instead of leaving wrap() with a stale inverse box; assign a new
+             array to change it
+        """
+        return self._box
+    @box.setter
+    def box(self,box):
+        if box is not None:
+            box = np.array(box,dtype=np.float64)
+            box.setflags(write=False)
+        self._box = box
+        self.updateWrap()
+    @property
+    def pbc(self):
+        R""" dimensions with periodic boundaries
+        """
+        return self._pbc
+    @pbc.setter
+    def pbc(self,pbc):
+        self._pbc = pbc
+        self.updateWrap()
     def buildNeighborhoods(self):
         R""" requests neighborhoods from the supplied NeighborList class
         """
@@ -130,12 +187,15 @@ class Snapshot:
             library (Library): the Library to map particles onto
 
         Returns:
-            m (array): the index of each particle in the provided Library
+            m (array): the index of each particle in the provided Library (-1 if not found)
         """
-        m = np.zeros(self.N,dtype=np.int) * np.nan
+        # translate each local signature once, then gather per particle
+        lib_ids = np.array([library.index.get(sig,-1) for sig in self.library.sigs],dtype=np.intp)
+        if getattr(self.library,'graph_idx',None) is not None:
+            return lib_ids[self.library.graph_idx]
+        m = np.full(self.N,-1,dtype=np.intp)
         for sig, idx in self.library.lookup.items():
-            if sig in library.index:
-                m[idx] = library.index[sig]
+            m[idx] = lib_ids[self.library.index[sig]]
         return m
     def wrap(self,v):
         R""" wrap vectors into the periodic simulation box (respecting non-periodic directions)
@@ -146,9 +206,19 @@ class Snapshot:
         Returns:
             w (array): array of wrapped vectors
         """
-        pbc = np.asarray([dim in self.pbc for dim in 'xyz'],dtype=np.float)
-        w = v - self.box * np.round( v / self.box * pbc)
+        if util.foundNumba:
+            return util.wrapVectors(np.asarray(v,dtype=np.float64),self._box,self._inv_box)
+        w = v - self._box * np.rint(v * self._inv_box)
         return w
+    def updateWrap(self):
+        R""" precompute the box quantities used by wrap(), called automatically
+             when Snapshot.box or Snapshot.pbc are assigned
+        """
+        if self._box is None or self._pbc is None:
+            self._inv_box = None
+            return
+        pbc_mask = np.asarray([dim in self._pbc for dim in 'xyz'],dtype=np.float64)
+        self._inv_box = pbc_mask / self._box
     def save(self,filename,neighbors=False,library=False):
         R""" save info from the Snapshot as a pickle binary
 
@@ -193,11 +263,16 @@ class Ensemble:
         self.library = classifiers.GraphLibrary()
         self.graph_lookups = {}
         self.dists = None
+        self.dist_dtype = np.float32
         self.valid_cols = None
         self.valid_rows = None
         self.invalid_rows = np.array([])
         self.dmap = dmap.DMap()
         self.color_rotation = None
+        self.binary_cmap = False
+        # processes per rank for writing color maps; keep at 1 under MPI, since
+        # forking after MPI_Init is unsafe and spawned children would re-import mpi4py
+        self.cmap_workers = 1
         self.comm, self.size, self.rank, self.master = parallel.info()
         self.p = parallel.ParallelTask()
     def insert(self,key,snap):
@@ -219,14 +294,10 @@ class Ensemble:
             key (hashable): the hashable key identifying this Snapshot in the graph_lookups dictionary
 
         Returns:
-            m (array): the index of each particle in the Ensemble-wide GraphLibrary
+            m (array): the index of each particle in the Ensemble-wide GraphLibrary (-1 if not found)
         """
         N = np.sum(np.asarray([len(val) for key, val in self.graph_lookups[snapkey].items()]))
-        m = np.zeros(N,dtype=np.int) * np.nan
-        for sig, idx in self.graph_lookups[snapkey].items():
-            if sig in self.library.index:
-                m[idx] = self.library.index[sig]
-        return np.array(m,dtype=np.int)
+        return util.scatterLookup(self.graph_lookups[snapkey],self.library.index,N)
     def collect(self):
         R""" query, obtain, and merge Ensembles constructed in parallel (using ParallelTask class) """
         others = self.p.gatherData(self)
@@ -262,25 +333,23 @@ class Ensemble:
         """
         if not self.master:
             return
-        self.lm_idx = np.array([],dtype=np.int)
+        self.lm_idx = np.array([],dtype=np.intp)
         if freq_top is not None:
-            self.lm_idx = np.hstack((self.lm_idx,np.sort(np.argsort(self.library.counts)[::-1][:freq_top]).flatten()))
+            self.lm_idx = np.hstack((self.lm_idx,util.topIndices(self.library.counts,freq_top)))
         if freq_thresh is not None:
             self.lm_idx = np.hstack((self.lm_idx,np.argwhere(self.library.counts >= freq_thresh).flatten()))
         if freq_pct is not None:
             self.lm_idx = np.hstack((self.lm_idx,np.argwhere(self.library.counts >= np.percentile(self.library.counts,freq_pct)).flatten()))
         if size_top is not None:
-            self.lm_idx = np.hstack((self.lm_idx,np.sort(np.argsort(self.library.sizes)[::-1][:freq_top]).flatten()))
+            self.lm_idx = np.hstack((self.lm_idx,util.topIndices(self.library.sizes,size_top)))
         if size_thresh is not None:
             self.lm_idx = np.hstack((self.lm_idx,np.argwhere(self.library.sizes >= freq_thresh).flatten()))
         if size_pct is not None:
             self.lm_idx = np.hstack((self.lm_idx,np.argwhere(self.library.sizes >= np.percentile(self.library.counts,size_pct)).flatten()))
         self.lm_idx = np.unique(self.lm_idx)
         if random is not None:
-            remaining = range(len(vals))
-            for idx in self.lm_idx:
-                remaining.remove(idx)
-            random = np.random.choice(remaining,num_random)
+            remaining = np.setdiff1d(np.arange(len(self.library.sigs)),self.lm_idx,assume_unique=True)
+            random = np.random.choice(remaining,min(random,len(remaining)),replace=False)
             self.lm_idx = np.unique(np.hstack((self.lm_idx,random)))
         self.lm_idx = np.unique(self.lm_idx)
         n = len(self.library.sigs)
@@ -291,11 +360,6 @@ class Ensemble:
         R""" compute distances between graphlet signatures, using landmarks if Ensemble.lm_idx has been set """
         if not self.master:
             return
-        # prepare NGDVs for distance calculation
-        dat = []
-        for g in self.library.items:
-            dat.append(g.ngdv)
-        dat = np.array(dat)
         # perform distance calculation
         n = len(self.library.sigs)
         try:
@@ -303,9 +367,24 @@ class Ensemble:
         except:
             m = n
             self.lm_idx = np.arange(n)
-        self.dists = np.zeros((n,m))
-        for i, lm in enumerate(self.lm_idx):
-            self.dists[:,i] = np.linalg.norm(dat-dat[lm],axis=1)
+        # an empty library has no ngdv_matrix yet
+        if self.library.ngdv_matrix is None:
+            self.dists = np.zeros((n,m),dtype=self.dist_dtype)
+            return
+        # NGDVs are stored contiguously by the GraphLibrary
+        dat = self.library.ngdv_matrix[:len(self.library.items)]
+        dat = dat.astype(self.dist_dtype,copy=False)
+        lm = dat[self.lm_idx]
+        if dat.shape[1] < 256 and self.dist_dtype == np.float32:
+            # short NGDVs: direct kernel avoids GEMM overhead and cancellation error
+            self.dists = _crayon.ngdvDists(dat,lm)
+            return
+        # expand |a-b|^2 = |a|^2 + |b|^2 - 2 a.b so the bulk of the work is a single GEMM
+        sq = np.einsum('ij,ij->i',dat,dat)
+        sq_lm = np.einsum('ij,ij->i',lm,lm)
+        d2 = sq[:,None] + sq_lm[None,:] - 2.*dat.dot(lm.T)
+        # clip small negative values arising from floating point cancellation
+        self.dists = np.sqrt(np.maximum(d2,0.))
     def detectDistOutliers(self,mode=None,thresh=None):
         R""" detect outliers in the distance matrix using either agglomerative
              clustering or simple cutoff
@@ -320,25 +399,15 @@ class Ensemble:
                 # filter outliers such as vapor particles
                 # first find bad landmarks
                 d = np.sum(self.dists,axis=0)
-                X = d.reshape(-1,1)
-                #
-                Z = hierarchy.linkage(X,'centroid')
-                c = hierarchy.fcluster(Z,np.median(d),criterion='distance')
-                c_med = [np.median(d[c==i]) for i in np.unique(c)]
-                c_best = int(np.unique(c)[np.argwhere(c_med == np.min(c_med))])
-                good_col = np.argwhere(c == c_best).flatten()
-                bad_col = np.argwhere(c != c_best).flatten()
+                good = util.lowestCluster(d,np.median(d))
+                good_col = np.argwhere(good).flatten()
                 self.lm_idx = self.lm_idx[good_col]
                 self.valid_cols = good_col
                 # then find other bad items
                 d = np.sum(self.dists,axis=1)
-                X = d.reshape(-1,1)
-                Z = hierarchy.linkage(X,'centroid')
-                c = hierarchy.fcluster(Z,np.median(d),criterion='distance')
-                c_med = [np.median(d[c==i]) for i in np.unique(c)]
-                c_best = int(np.unique(c)[np.argwhere(c_med == np.min(c_med))])
-                self.valid_rows = np.argwhere(c == c_best).flatten()
-                self.invalid_rows = np.argwhere(c != c_best).flatten()
+                good = util.lowestCluster(d,np.median(d))
+                self.valid_rows = np.argwhere(good).flatten()
+                self.invalid_rows = np.argwhere(~good).flatten()
             elif mode == 'cutoff':
                 self.valid_cols = np.arange(self.dists.shape[1])
                 d = np.min(self.dists,axis=1)
@@ -347,35 +416,75 @@ class Ensemble:
     def writeColors(self):
         R""" write color of each particle to file, in the order they appear in each Snapshot
              column 1 is signature index, columns 2-4 are RGB values
+
+             frames are written serially unless Ensemble.cmap_workers > 1, in which case
+             a multiprocessing.Pool is used on each rank (only safe without MPI, or with an
+             MPI implementation that tolerates fork)
         """
         # share data among workers
+        keys = None
         frame_maps = None
         color_coords = None
         if self.master:
             color_coords = np.copy(self.dmap.color_coords)
-            frame_maps = {}
-            for key in self.graph_lookups.keys():
-                frame_maps[key] = self.backmap(key)
+            # sort once here so every rank sees the same order
+            keys = sorted(self.graph_lookups.keys())
+            frame_maps = [self.backmap(key) for key in keys]
         color_coords = self.p.shareData(color_coords)
+        keys = self.p.shareData(keys)
         frame_maps = self.p.shareData(frame_maps)
         # map local structure indices to ensemble
-        keys = frame_maps.keys()
-        keys.sort() # keys are not guaranteed to appear in the same order
         local_file_idx  = parallel.partition(range(len(keys)))
-        for f in local_file_idx:
-            filename = keys[f]
-            fm = frame_maps[keys[f]].reshape(-1,1)
-            cc = color_coords[fm,np.array([1,2,3])]
-            if self.color_rotation is not None:
-                if type(self.color_rotation) == tuple:
-                    self.color_rotation = [self.color_rotation]
-                for rot in self.color_rotation:
-                    cc = util.rotate(cc,rot[0],rot[1])
-            # need to distribute invalid_rows across ranks
-            # for inv in self.invalid_rows:
-            #     fm[fm==inv] = -1
-            fdat = np.hstack((fm,cc))
-            np.savetxt(filename + '.cmap', fdat)
+        # fold all color rotations into one matrix, applied once per frame
+        R = self.colorRotationMatrix()
+        def frameTasks():
+            for f in local_file_idx:
+                filename = keys[f]
+                fm = frame_maps[f].reshape(-1,1)
+                # particles missing from the library (-1) are colored white, like nan rows
+                idx = fm.ravel()
+                valid = idx >= 0
+                cc = np.ones((len(idx),3))
+                # slice the RGB columns so only the rows are fancy-indexed
+                cc[valid] = color_coords[idx[valid],1:4]
+                # need to distribute invalid_rows across ranks
+                # for inv in self.invalid_rows:
+                #     fm[fm==inv] = -1
+                yield (filename,fm,cc,R,self.binary_cmap)
+        tasks = frameTasks()
+        workers = min(max(int(self.cmap_workers),1),len(local_file_idx))
+        if workers > 1:
+            # frames are independent, so overlap formatting and I/O across local cores;
+            # hand out one frame per worker at a time to bound memory use
+            # (Pool would otherwise drain the whole generator up front)
+            pool = multiprocessing.Pool(workers)
+            try:
+                while True:
+                    batch = list(itertools.islice(tasks,workers))
+                    if len(batch) == 0:
+                        break
+                    pool.map(_writeFrame,batch)
+            except:
+                pool.terminate()
+                raise
+            else:
+                pool.close()
+            finally:
+                pool.join()
+        else:
+            for task in tasks:
+                _writeFrame(task)
+    def colorRotationMatrix(self):
+        R""" combine Ensemble.color_rotation into a single rotation matrix
+
+        Returns:
+            R (array): `3x3` rotation matrix (None if no rotation is set)
+        """
+        if self.color_rotation is None:
+            return None
+        if type(self.color_rotation) == tuple:
+            self.color_rotation = [self.color_rotation]
+        return util.compositeRotation(self.color_rotation)
     def buildDMap(self):
         R""" builds the diffusion map from pre-computed distances (computes them if necessary) """
         if self.master:
@@ -398,11 +507,9 @@ class Ensemble:
             return
         cd = np.copy(self.dmap.coords[:,1:4])
         cc = np.copy(self.dmap.color_coords[:,1:4])
-        if self.color_rotation is not None:
-            if type(self.color_rotation) == tuple:
-                self.color_rotation = [self.color_rotation]
-            for rot in self.color_rotation:
-                cc = util.rotate(cc,rot[0],rot[1])
+        R = self.colorRotationMatrix()
+        if R is not None:
+            cc = util.applyRotation(cc,R)
         # find bounds
         box = 2.*np.max(np.abs(cd),axis=0)
         snap = Snapshot()
@@ -412,4 +519,4 @@ class Ensemble:
         io.writeXYZ('%s'%filename,snap)
         fm = np.arange(snap.N).reshape(-1,1)
         fdat = np.hstack((fm,cc))
-        np.savetxt('%s.cmap'%filename,fdat)
+        writeColorMap(filename,fdat,binary=self.binary_cmap)
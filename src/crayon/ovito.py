@@ -15,7 +15,13 @@ def modify(frame, input, output):
 	try:
 		cmap = np.loadtxt(source + '.cmap')
 	except:
-		cmap = np.loadtxt(source + '-%d.cmap'%frame)
+		try:
+			cmap = np.load(source + '.cmap.npy')
+		except:
+			try:
+				cmap = np.loadtxt(source + '-%d.cmap'%frame)
+			except:
+				cmap = np.load(source + '-%d.cmap.npy'%frame)
 	color_property = output.create_particle_property(ovito.data.ParticleProperty.Type.Color)
 	N = len(color_property.marray)
 	for i in range(N):
@@ -7,8 +7,74 @@
 
 from __future__ import print_function
 
+import heapq
+
 import numpy as np
 
+try:
+    from numba import njit, prange
+    foundNumba = True
+except:
+    foundNumba = False
+
+# cache of rotation matrices keyed by (axis,turns)
+_rotation_matrices = {}
+
+def rotationMatrix(axis,turns):
+    R""" rotation matrix for 90-degree turns about one of the three axes,
+         computed once per (axis,turns) and cached
+
+    Args:
+        axis (int): axis to rotate around, specified as column (0=x,1=y,2=z)
+        turns (int): number of 90-degree turns along the axis
+
+    Returns:
+        R (array): `3x3` rotation matrix (read-only)
+    """
+    key = (int(axis),int(turns)%4)
+    if key not in _rotation_matrices:
+        theta = key[1] * 0.5 * np.pi
+        c, s = np.cos(theta), np.sin(theta)
+        R = [np.array([[1, 0,  0],
+                       [0, c, -s],
+                       [0, s,  c]]),
+             np.array([[ c, 0, s],
+                       [ 0, 1, 0],
+                       [-s, 0, c]]),
+             np.array([[c, -s, 0],
+                       [s,  c, 0],
+                       [0,  0, 1]])][key[0]]
+        R.setflags(write=False)
+        _rotation_matrices[key] = R
+    return _rotation_matrices[key]
+
+def compositeRotation(rotations):
+    R""" combine a sequence of rotations into a single rotation matrix
+
+    Args:
+        rotations (list): list of (axis,turns) tuples, applied in order
+
+    Returns:
+        R (array): `3x3` rotation matrix equivalent to applying all rotations
+    """
+    R = np.eye(3)
+    for axis, turns in rotations:
+        R = np.matmul(R,rotationMatrix(axis,turns))
+    return R
+
+def applyRotation(coords,R):
+    R""" rotate 3D color coordinates about the center of the unit cube
+
+    Args:
+        coords (array): `Nx3` array containing coordinates
+        R (array): `3x3` rotation matrix
+
+    Returns:
+        rcoords (array): `Nx3` array containing rotated coordinates
+    """
+    t = 0.5*np.ones(3)
+    return t+np.matmul(coords-t,R)
+
 def rotate(coords,axis,turns):
     R""" rotate 3D color coordinates along one of the three axes
          (must be limited like this to hold coordinates inside unit cube)
@@ -21,20 +87,7 @@ def rotate(coords,axis,turns):
     Returns:
         rcoords (array): `Nx3` array containing rotated coordinates
     """
-    theta = int(turns) * 0.5 * np.pi
-    R = []
-    R.append( np.array([[1, 0,              0],
-                        [0, np.cos(theta), -np.sin(theta)],
-                        [0, np.sin(theta),  np.cos(theta)]]) )
-    R.append( np.array([[ np.cos(theta), 0, np.sin(theta)],
-                        [ 0,             1, 0],
-                        [-np.sin(theta), 0, np.cos(theta)]]) )
-    R.append( np.array([[np.cos(theta), -np.sin(theta), 0],
-                        [np.sin(theta),  np.cos(theta), 0],
-                        [0,              0,             1]]) )
-    t = 0.5*np.ones(3)
-    rcoords = t+np.matmul(coords-t,R[axis])
-    return rcoords
+    return applyRotation(coords,rotationMatrix(axis,turns))
 
 def rankTransform(R):
     R""" transforms each column to provide uniform distribution over (0,1)
@@ -48,12 +101,148 @@ def rankTransform(R):
     # transform data to uniform distribution
     T = np.zeros(R.shape)*np.nan
     # transform each remaining eigenvector to yield a uniform distribution
-    for i in range(R.shape[1]):
-        r = R[:,i]
-        idx = np.argsort(r[r==r])
-        rs = r[r==r][idx]
-        x = np.linspace(0.,1.,len(rs))
-        T[:,i] = np.interp(r,rs,x)
+    if foundNumba:
+        _rankTransformColumns(np.asarray(R,dtype=np.float64),T)
+    else:
+        _rankTransformColumnsNumpy(R,T)
     nan_idx = np.argwhere(np.isnan(T[:,-1])).flatten()
     T[nan_idx,:] = 1.
     return T
+
+def _rankTransformColumnsNumpy(R,T):
+    R""" NumPy kernel for rankTransform (nan entries are left untouched in T)
+
+    Args:
+        R (array): coordinates
+        T (array): output array, same shape as R
+    """
+    for i in range(R.shape[1]):
+        r = R[:,i]
+        valid = np.argwhere(r==r).flatten()
+        v = r[valid]
+        # tied values share the rank of the last tie, as np.interp would give
+        pos = np.searchsorted(np.sort(v),v,side='right') - 1
+        T[valid,i] = np.linspace(0.,1.,len(valid))[pos]
+
+def topIndices(vals,k):
+    R""" find the indices of the k largest values using a partial sort
+
+    Args:
+        vals (array): values to rank
+        k (int): number of indices to return
+
+    Returns:
+        idx (array): sorted indices of the k largest values
+    """
+    k = min(int(k),len(vals))
+    if k < 1:
+        return np.array([],dtype=np.intp)
+    top = np.argpartition(vals,-k)[-k:]
+    return np.sort(top)
+
+def lowestCluster(d,t):
+    R""" find the lowest flat cluster of 1D data under centroid-linkage agglomerative
+         clustering cut at distance t, i.e. the cluster of smallest values that
+         hierarchy.fcluster(hierarchy.linkage(d,'centroid'),t,criterion='distance')
+         would produce, in O(n log n)
+
+    Args:
+        d (array): 1D data
+        t (float): maximum cophenetic distance within a flat cluster
+
+    Returns:
+        mask (array): boolean array, True for members of the lowest cluster
+    """
+    d = np.asarray(d,dtype=np.float64)
+    n = len(d)
+    s = np.sort(d)
+    # in 1D, clusters stay contiguous in sorted order and the closest centroids
+    # are always neighbors, so only adjacent clusters are candidates for merging;
+    # clusters are identified by their first sorted index
+    hi = list(range(n))
+    nxt = list(range(1,n)) + [-1]
+    prv = list(range(-1,n-1))
+    total = s.tolist()
+    count = [1]*n
+    height = [0.]*n
+    version = [0]*n
+    heap = [(s[i+1]-s[i],i,0,i+1,0) for i in range(n-1)]
+    heapq.heapify(heap)
+    while heap:
+        h, a, va, b, vb = heapq.heappop(heap)
+        if version[a] != va or version[b] != vb:
+            continue
+        h_new = max(h,height[a],height[b])
+        # fcluster keeps the largest subtree whose merges all lie below t
+        if a == 0 and h_new > t:
+            return d <= s[hi[0]]
+        # merge b into a
+        total[a] += total[b]
+        count[a] += count[b]
+        hi[a] = hi[b]
+        height[a] = h_new
+        version[a] += 1
+        version[b] = -1
+        nxt[a] = nxt[b]
+        if nxt[a] != -1:
+            prv[nxt[a]] = a
+        for l, r in ((prv[a],a),(a,nxt[a])):
+            if l != -1 and r != -1:
+                dc = abs(total[r]/count[r] - total[l]/count[l])
+                heapq.heappush(heap,(dc,l,version[l],r,version[r]))
+    return np.ones(n,dtype=bool)
+
+def scatterLookup(lookup,index,N):
+    R""" map particles to library indices from a signature lookup,
+         using a single vectorized scatter instead of one assignment per signature
+
+    Args:
+        lookup (dict): particle indices for each signature (e.g., GraphLibrary.lookup)
+        index (dict): library index of each signature (e.g., GraphLibrary.index)
+        N (int): number of particles
+
+    Returns:
+        m (array): library index of each particle (-1 if its signature is not in index)
+    """
+    m = np.full(N,-1,dtype=np.intp)
+    sigs = [sig for sig in lookup if sig in index]
+    if len(sigs) == 0:
+        return m
+    idx = np.hstack([lookup[sig] for sig in sigs]).astype(np.intp)
+    counts = [len(lookup[sig]) for sig in sigs]
+    m[idx] = np.repeat([index[sig] for sig in sigs],counts)
+    return m
+
+if foundNumba:
+    @njit(parallel=True,cache=True)
+    def _rankTransformColumns(R,T):
+        R""" JIT-compiled kernel for rankTransform, identical output to the NumPy kernel
+             (columns are processed in parallel, nan entries are left untouched in T)
+
+        Args:
+            R (array): coordinates
+            T (array): output array, same shape as R
+        """
+        for j in prange(R.shape[1]):
+            col = R[:,j]
+            valid = np.where(col == col)[0]
+            v = col[valid]
+            # tied values share the rank of the last tie, independent of sort stability
+            pos = np.searchsorted(np.sort(v),v,side='right') - 1
+            denom = max(len(valid)-1,1)
+            for k in range(len(valid)):
+                T[valid[k],j] = float(pos[k]) / denom
+
+    @njit(cache=True)
+    def wrapVectors(v,box,inv_box):
+        R""" JIT-compiled kernel for Snapshot.wrap
+
+        Args:
+            v (array): array of vectors to wrap into the box
+            box (array): box dimensions (`Lx,Ly,Lz`)
+            inv_box (array): inverse box dimensions, zero along non-periodic directions
+
+        Returns:
+            w (array): array of wrapped vectors
+        """
+        return v - box * np.rint(v * inv_box)
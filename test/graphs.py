@@ -14,7 +14,7 @@ o = np.array([1, 2, 2, 2, 3, 4, 3, 3, 4, 3,
               7, 6, 7, 6, 5, 5, 6, 8, 7, 6,
               6, 8, 6, 9, 5, 6, 4, 6, 6, 7,
               8, 6, 6, 8, 7, 6, 7, 7, 8, 5,
-              6, 6, 4],dtype=np.float)
+              6, 6, 4],dtype=np.float64)
 
 w = 1. - np.log(o) / np.log(73.)
 
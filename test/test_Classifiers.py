@@ -75,5 +75,18 @@ class TestCrayon(unittest.TestCase):
         # test collect with identical libraries
         # test collect with non-identical libraries
 
+    def testGraphLibraryNGDVMatrix(self):
+        lib = crayon.classifiers.GraphLibrary()
+        # enough unique graphs to grow ngdv_matrix past its initial capacity
+        for i in range(40):
+            G = crayon.classifiers.Graph((np.array([i,1]),np.random.rand(73)))
+            lib.encounter(G)
+        # a repeated graph must not add a row
+        lib.encounter(lib.items[3])
+        self.assertEqual(len(lib.items),40)
+        self.assertTrue(len(lib.ngdv_matrix) >= len(lib.items))
+        np.testing.assert_array_almost_equal(np.array([g.ngdv for g in lib.items]),
+                                             lib.ngdv_matrix[:len(lib.items)])
+
 if __name__ == "__main__":
     unittest.main(argv = ['test.py', '-v'])
@@ -87,5 +87,32 @@ class ValidateComparison(unittest.TestCase):
                 D = _crayon.gdda(self.aList[i],self.aList[j])
                 np.testing.assert_array_almost_equal(Aj,D,6)
 
+class TestNGDVDists(unittest.TestCase):
+    # run this every time
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.A = rng.rand(37,73).astype(np.float32)
+        self.B = rng.rand(11,73).astype(np.float32)
+
+    # test distances against numpy broadcasting
+    def testNGDVDists(self):
+        D = _crayon.ngdvDists(self.A,self.B)
+        expected = np.linalg.norm(self.A[:,None]-self.B[None],axis=2)
+        self.assertEqual(D.shape,(37,11))
+        self.assertEqual(D.dtype,np.float32)
+        np.testing.assert_array_almost_equal(expected,D,5)
+
+    # test that float64 and non-contiguous inputs are converted
+    def testNGDVDistsConvert(self):
+        A = np.asfortranarray(self.A.astype(np.float64))
+        D = _crayon.ngdvDists(A,self.B[::2])
+        expected = np.linalg.norm(self.A[:,None]-self.B[::2][None],axis=2)
+        np.testing.assert_array_almost_equal(expected,D,5)
+
+    # test that mismatched NGDV lengths are rejected
+    def testNGDVDistsMismatch(self):
+        with self.assertRaises(ValueError):
+            _crayon.ngdvDists(self.A,self.B[:,:72])
+
 if __name__ == "__main__":
     unittest.main(argv = ['test.py', '-v'])
@@ -31,5 +31,19 @@ class TestCrayon(unittest.TestCase):
     def testInit(self):
         pass
 
+    def testSnapshotWrap(self):
+        xyz = np.random.rand(10,3)
+        snap = crayon.nga.Snapshot(xyz=xyz,box=np.array([10.,10.,10.]),pbc='xyz')
+        v = np.array([[6.,-6.,3.]])
+        np.testing.assert_array_almost_equal(np.array([[-4.,4.,3.]]),snap.wrap(v))
+        # assigning a new box or pbc must refresh the cached inverse box
+        snap.box = np.array([4.,4.,4.])
+        np.testing.assert_array_almost_equal(np.array([[-2.,2.,-1.]]),snap.wrap(v))
+        snap.pbc = 'z'
+        np.testing.assert_array_almost_equal(np.array([[6.,-6.,-1.]]),snap.wrap(v))
+        # in-place edits would leave the cache stale, so they must fail
+        with self.assertRaises(ValueError):
+            snap.box[0] = 8.
+
 if __name__ == "__main__":
     unittest.main(argv = ['test.py', '-v'])
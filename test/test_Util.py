@@ -0,0 +1,128 @@
+#
+# test_Util.py
+# unit tests for the crayon python module
+#
+# Copyright (c) 2018 Wesley Reinhart.
+# This file is part of the crayon project, released under the Modified BSD License.
+
+import numpy as np
+
+import os
+test_path = os.path.abspath(os.path.dirname(__file__))
+build_path = os.getcwd()
+src_path = test_path[:test_path.rfind('/test')] + '/src'
+
+import sys
+sys.path.insert(0,build_path)
+sys.path.insert(0,src_path)
+import crayon
+
+sys.path.insert(0,test_path)
+
+from scipy.cluster import hierarchy
+
+import unittest
+
+class TestUtil(unittest.TestCase):
+    # run this every time
+    def setUp(self):
+        pass
+
+    def testRotate(self):
+        coords = np.array([[1.0, 0.5, 0.5],
+                           [0.2, 0.3, 0.4]])
+        r = crayon.util.rotate(coords,2,1)
+        np.testing.assert_array_almost_equal(np.array([[0.5, 0.0, 0.5],
+                                                       [0.3, 0.8, 0.4]]),r)
+        # four quarter turns give the identity
+        R = crayon.util.compositeRotation([(0,1),(0,1),(0,1),(0,1)])
+        np.testing.assert_array_almost_equal(np.eye(3),R)
+        # composite matrix matches sequential rotations
+        rots = [(0,1),(2,3),(1,2)]
+        seq = coords
+        for axis, turns in rots:
+            seq = crayon.util.rotate(seq,axis,turns)
+        comp = crayon.util.applyRotation(coords,crayon.util.compositeRotation(rots))
+        np.testing.assert_array_almost_equal(seq,comp)
+
+    def testRankTransform(self):
+        R = np.array([[ 0.3, 2.0],
+                      [-1.0, 5.0],
+                      [ 7.0, 1.0],
+                      [ 0.5, 3.0],
+                      [ 2.0, 4.0]])
+        T = crayon.util.rankTransform(R)
+        expected = np.array([[0.25, 0.25],
+                             [0.00, 1.00],
+                             [1.00, 0.00],
+                             [0.50, 0.50],
+                             [0.75, 0.75]])
+        np.testing.assert_array_almost_equal(expected,T)
+
+    def testRankTransformNan(self):
+        R = np.array([[0.3,    2.0],
+                      [np.nan, np.nan],
+                      [7.0,    1.0]])
+        T = crayon.util.rankTransform(R)
+        expected = np.array([[0., 1.],
+                             [1., 1.],
+                             [1., 0.]])
+        np.testing.assert_array_almost_equal(expected,T)
+
+    def testRankTransformTies(self):
+        R = np.array([[1.0, 2.0],
+                      [1.0, 2.0],
+                      [1.0, 3.0],
+                      [0.0, 1.0]])
+        T = crayon.util.rankTransform(R)
+        expected = np.array([[1., 2./3.],
+                             [1., 2./3.],
+                             [1., 1.],
+                             [0., 0.]])
+        np.testing.assert_array_almost_equal(expected,T)
+
+    def testRankTransformNumba(self):
+        if not crayon.util.foundNumba:
+            self.skipTest('numba not available')
+        rng = np.random.RandomState(0)
+        R = rng.randint(0,5,size=(50,4)).astype(np.float64)
+        R[rng.rand(50,4) < 0.1] = np.nan
+        T_nb = np.zeros(R.shape)*np.nan
+        T_np = np.zeros(R.shape)*np.nan
+        crayon.util._rankTransformColumns(R,T_nb)
+        crayon.util._rankTransformColumnsNumpy(R,T_np)
+        np.testing.assert_array_almost_equal(T_np,T_nb)
+
+    def testScatterLookup(self):
+        lookup = {'a': np.array([0,3]), 'b': np.array([1]), 'c': np.array([2,4])}
+        index = {'a': 5, 'c': 2}
+        m = crayon.util.scatterLookup(lookup,index,5)
+        np.testing.assert_array_equal(np.array([5,-1,2,5,2]),m)
+
+    def testLowestCluster(self):
+        d = np.array([1.0,1.2,9.0,0.9,1.1,8.5])
+        mask = crayon.util.lowestCluster(d,1.)
+        np.testing.assert_array_equal(np.array([True,True,False,True,True,False]),mask)
+        mask = crayon.util.lowestCluster(d,10.)
+        self.assertTrue(np.all(mask))
+
+    def testLowestClusterLinkage(self):
+        # must reproduce centroid linkage + fcluster on a cluster with outliers
+        rng = np.random.RandomState(0)
+        for trial in range(50):
+            d = np.hstack((rng.normal(10.,1.,200),rng.uniform(18.,30.,rng.randint(1,10))))
+            rng.shuffle(d)
+            t = np.median(d)
+            Z = hierarchy.linkage(d.reshape(-1,1),'centroid')
+            c = hierarchy.fcluster(Z,t,criterion='distance')
+            c_med = [np.median(d[c==i]) for i in np.unique(c)]
+            c_best = np.unique(c)[np.argmin(c_med)]
+            np.testing.assert_array_equal(c == c_best,crayon.util.lowestCluster(d,t))
+
+    def testTopIndices(self):
+        vals = np.array([3,9,1,7,5])
+        np.testing.assert_array_equal(np.array([1,3]),crayon.util.topIndices(vals,2))
+        np.testing.assert_array_equal(np.arange(5),crayon.util.topIndices(vals,10))
+
+if __name__ == "__main__":
+    unittest.main(argv = ['test.py', '-v'])